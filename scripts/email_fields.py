@@ -0,0 +1,97 @@
+"""
+Cheap field extraction for the exported email JSON files
+The scripts here only ever look at a couple of top-level string fields, so
+scan the head of the file for them and skip parsing the (often huge) body
+"""
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    # Optional: parses straight from bytes, several times faster than json
+    from orjson import loads
+except ImportError:
+    from json import loads
+
+HEAD_BYTES = 8192
+
+_field_res = {}
+
+def _field_re(field):
+    pattern = _field_res.get(field)
+    if pattern is None:
+        key = re.escape(json.dumps(field).encode())
+        pattern = _field_res[field] = re.compile(key + rb'\s*:\s*("(?:[^"\\]|\\.)*")')
+    return pattern
+
+# A whole JSON string, or a bracket that changes the nesting depth
+_TOKEN_RE = re.compile(rb'"(?:[^"\\]|\\.)*"|[{}\[\]]')
+
+def _top_level_match(pattern, head):
+    """Return the first match of pattern that is a key of the outermost object
+
+    Brackets are counted outside strings up to each candidate, so a key of
+    the same name in a nested object (a quoted thread, say) is skipped
+    """
+    depth = 0
+    tok = _TOKEN_RE.search(head)
+    for m in pattern.finditer(head):
+        start = m.start()
+        while tok is not None and tok.end() <= start:
+            c = tok.group()[0]
+            if c in b"{[":
+                depth += 1
+            elif c in b"}]":
+                depth -= 1
+            tok = _TOKEN_RE.search(head, tok.end())
+        if tok is not None and tok.start() < start:
+            # The candidate is the tail of a longer string
+            continue
+        if depth == 1:
+            return m
+    return None
+
+def read_fields(path, fields):
+    """Return {field: value} for the given top-level fields of an email file
+
+    Falls back to a full parse when any field isn't found at the top level
+    of the head. Fields absent from the email are omitted, so callers can
+    use .get()
+    """
+    with open(path, "rb", buffering=65536) as fp:
+        head = fp.read(HEAD_BYTES)
+        found = {}
+        for field in fields:
+            m = _top_level_match(_field_re(field), head)
+            if m is None:
+                break
+            found[field] = loads(m.group(1))
+        else:
+            return found
+        email = loads(head + fp.read())
+    return {field: email[field] for field in fields if field in email}
+
+def scan_json_files(folder):
+    """Return the paths of the .json files in folder, unsorted ([] if missing)"""
+    try:
+        with os.scandir(folder) as it:
+            return [e.path for e in it if e.name.endswith(".json")]
+    except FileNotFoundError:
+        return []
+
+def json_files(folder):
+    """Return the sorted paths of the .json files in folder ([] if missing)"""
+    paths = scan_json_files(folder)
+    paths.sort()
+    return paths
+
+def map_files(fn, paths):
+    """Yield fn(path) for each path in order, spread over a process pool
+
+    fn must be a module-level function so it can be pickled to the workers
+    """
+    paths = list(paths)
+    chunksize = max(1, len(paths) // (4 * (os.cpu_count() or 1)))
+    with ProcessPoolExecutor() as ex:
+        yield from ex.map(fn, paths, chunksize=chunksize)
@@ -7,61 +7,88 @@ Usage:
   python sample_emails.py -s boxshop --files  # just print filenames for piping
 """
 import argparse
-import json
+import heapq
+import os
 import sys
+from collections import deque
 from pathlib import Path
 
+from email_fields import map_files, read_fields, scan_json_files
+
+def _extract(path):
+    """Return (sender, subject, error) for one email file"""
+    try:
+        email = read_fields(path, ("from", "subject"))
+    except Exception as e:
+        return None, None, str(e)
+    return email.get("from", "unknown"), email.get("subject", "no subject"), None
+
+def _positive_int(value):
+    try:
+        n = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: {value!r}")
+    if n < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {n}")
+    return n
+
 def sample_emails(folder="emails/needs_review", count=100, search=None, files_only=False):
     folder_path = Path(folder)
     if not folder_path.exists():
         print(f"Folder not found: {folder}", file=sys.stderr)
         return []
 
-    files = sorted(folder_path.glob("*.json"))
-    total = len(files)
+    paths = scan_json_files(folder)
+    total = len(paths)
 
-    matches = []
-    for f in files:
-        try:
-            with open(f) as fp:
-                email = json.load(fp)
-            sender = email.get("from", "unknown")
-            subject = email.get("subject", "no subject")
-
-            if search:
-                search_lower = search.lower()
+    if search:
+        search_lower = search.lower()
+        files = sorted(paths)
+        # Only the most recent N matches are kept
+        recent = deque(maxlen=count)
+        found = 0
+        for f, (sender, subject, error) in zip(files, map_files(_extract, files)):
+            if error is not None:
+                continue
+            try:
                 if search_lower not in sender.lower() and search_lower not in subject.lower():
                     continue
-
-            matches.append((f, sender, subject))
-        except Exception as e:
-            if not search:
-                matches.append((f, "error", str(e)))
+            except Exception:
+                continue
+            found += 1
+            recent.append((f, sender, subject))
+    else:
+        # Filenames sort oldest first, so the most recent N are the largest
+        files = heapq.nlargest(count, paths)
+        files.reverse()
+        recent = []
+        for f, (sender, subject, error) in zip(files, map_files(_extract, files)):
+            if error is not None:
+                recent.append((f, "error", error))
+            else:
+                recent.append((f, sender, subject))
 
     if not files_only:
         if search:
-            print(f"Found {len(matches)} matching '{search}' in {folder} ({total} total)\n")
+            print(f"Found {found} matching '{search}' in {folder} ({total} total)\n")
         else:
             print(f"Total: {total} emails in {folder}\n")
 
-    # Get the most recent N
-    recent = matches[-count:] if len(matches) > count else matches
-
+    # One write for the whole listing rather than four prints per email
+    out = []
     for f, sender, subject in recent:
         if files_only:
-            print(f)
+            out.append(f"{f}\n")
         else:
-            print(f"{f.name}")
-            print(f"  {sender}")
-            print(f"  {subject}")
-            print()
+            out.append(f"{os.path.basename(f)}\n  {sender}\n  {subject}\n\n")
+    sys.stdout.write("".join(out))
 
-    return [str(f) for f, _, _ in recent]
+    return [f for f, _, _ in recent]
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Sample emails from a folder")
     parser.add_argument("folder", nargs="?", default="emails/needs_review", help="Folder to search")
-    parser.add_argument("-n", "--count", type=int, default=100, help="Number of emails to show")
+    parser.add_argument("-n", "--count", type=_positive_int, default=100, help="Number of emails to show")
     parser.add_argument("-s", "--search", help="Filter by sender or subject (case-insensitive)")
     parser.add_argument("--files", action="store_true", help="Only print full file paths (for piping)")
     args = parser.parse_args()
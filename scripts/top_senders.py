@@ -1,23 +1,75 @@
 #!/usr/bin/env python3
-import json
-from pathlib import Path
 from collections import Counter
+import heapq
+from operator import itemgetter
 import sys
 
+from email_fields import map_files, read_fields, scan_json_files
+
+# Above this many files, count with a bounded sketch instead of exactly
+EXACT_LIMIT = 100_000
+SKETCH_SIZE = 2048
+
+class SpaceSaving:
+    """Space-Saving heavy-hitter sketch holding at most `size` counters
+
+    When full, a new item replaces the smallest counter and inherits its
+    count, so counts may be overestimated by at most that minimum. With the
+    skewed sender distribution of a real inbox the top entries are exact
+    or very close.
+    """
+
+    def __init__(self, size=SKETCH_SIZE):
+        self.size = size
+        self.counts = {}
+        # One (count, item) entry per tracked item; the count may lag behind
+        # self.counts and is refreshed lazily when it reaches the top
+        self._heap = []
+
+    def add(self, item):
+        counts = self.counts
+        if item in counts:
+            counts[item] += 1
+            return
+        if len(counts) < self.size:
+            counts[item] = 1
+            heapq.heappush(self._heap, (1, item))
+            return
+        heap = self._heap
+        while True:
+            count, victim = heap[0]
+            if counts[victim] == count:
+                break
+            heapq.heapreplace(heap, (counts[victim], victim))
+        del counts[victim]
+        counts[item] = count + 1
+        heapq.heapreplace(heap, (count + 1, item))
+
+    def most_common(self, n):
+        return heapq.nlargest(n, self.counts.items(), key=itemgetter(1))
+
+def _sender(path):
+    """Return the sender of one email file, or "" if it can't be read"""
+    try:
+        return read_fields(path, ("from",)).get("from", "")
+    except (ValueError, KeyError):
+        return ""
+
 def main():
     path = sys.argv[1] if len(sys.argv) > 1 else "emails/inbox"
     limit = int(sys.argv[2]) if len(sys.argv) > 2 else 50
-    emails_dir = Path(path)
-    senders = Counter()
-
-    for json_file in emails_dir.glob("*.json"):
-        try:
-            data = json.loads(json_file.read_text())
-            sender = data.get("from", "")
-            if sender:
-                senders[sender] += 1
-        except (json.JSONDecodeError, KeyError):
-            continue
+    files = scan_json_files(path)
+    found = filter(None, map_files(_sender, files))
+
+    if len(files) < EXACT_LIMIT:
+        # Counter() tallies an iterable in C, no per-sender Python loop
+        senders = Counter(found)
+    else:
+        print(f"{len(files)} files, counts are approximate", file=sys.stderr)
+        senders = SpaceSaving()
+        for sender in found:
+            senders.add(sender)
+
     for sender, count in senders.most_common(limit):
         print(f"{count:5d}  {sender}")
 
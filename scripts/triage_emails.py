@@ -1,255 +1,123 @@
 #!/usr/bin/env python3
 """
 Email triage script - categorizes emails based on sender domain
-Add domains to ARCHIVE_SENDERS as we confirm they're archivable
+Add domains to archive_senders.txt as we confirm they're archivable
 """
-import json
+import functools
 import os
-import shutil
+import re
+import sqlite3
 from pathlib import Path
-from collections import defaultdict
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from email_fields import json_files, read_fields
 
 INBOX = Path("emails/inbox")
 TO_ARCHIVE = Path("emails/to_archive")
 NEEDS_REVIEW = Path("emails/needs_review")
+# Remembers the sender of each file left in the inbox, so re-runs after
+# adding to archive_senders.txt don't have to read those files again
+CACHE_DB = Path("emails/.triage_cache.db")
+# Bump when the way senders are extracted changes, to drop stale rows
+CACHE_VERSION = 2
+# Per-file work is mostly open/read/rename, so threads overlap the I/O waits
+TRIAGE_WORKERS = 32
 
-# Senders to always archive - add domains here as we confirm they're noise
-ARCHIVE_SENDERS = {
-    "honeybirdette.com",
-    "e.inc.com",
-    "service.tiktok.com",
-    "a.grubhub.com",
-    "ocasiocortez.com",
-    "e4.rover.com",
-    "petfood.express",
-    # batch 2
-    "substack.com",
-    "piratewires.com",
-    "email.nanit.com",
-    "news.thebump.com",
-    "email.chipotle.com",
-    "mail.toogoodtogo.com",
-    "defaultkings.com",
-    "thetiebar.com",
-    "listi.jpberlin.de",
-    # batch 3 - notifications
-    "voice-noreply@google.com",
-    "notifications@bugsnag.com",
-    "squaremktg.com",
-    "txt.voice.google.com",
-    # batch 4 - more notifications
-    "noreply@bambulab.com",
-    "gusto.com",
-    "inform.bill.com",
-    "no-reply@digikey.com",
-    "notification.intuit.com",
-    "NoReply.ODD@dhl.com",
-    "no-reply-aws@amazon.com",
-    "cloudplatform-noreply@google.com",
-    "no-reply@accounts.google.com",
-    "workspace-noreply@google.com",
-    "no-reply@amazon.com",
-    "no-reply@patreon.com",
-    "no-reply@mailchimp.com",
-    "donotreply@appfolio.com",
-    "donotreply@onlineportal.appfolio.com",
-    "members.mobilize.io",
-    "catalystcampus.org",
-    "info@prusa3d.com",
-    "payments-noreply@google.com",
-    "stellerarts.com",
-    "drive-shares-dm-noreply@google.com",
-    # batch 5 - more notifications/marketing
-    "simon-mail.groometransportation.com",
-    "noreply@qemailserver.com",
-    "notifications.intuit.com",
-    "email.slackhq.com",
-    "adeointeractive.com",
-    "cps.iau.org",
-    "email.claude.com",
-    # batch 6 - newsletters/marketing
-    "info@printables.com",
-    "qualtrics-research.com",
-    "Publications.spie.org",
-    "info@swfound.org",
-    "no-reply@login.gov",
-    "drangkromeet.com",
-    # batch 7 - old newsletters/lists
-    "secondtimefounders.com",
-    "trwih.com",
-    "barbaraleeforcongress.org",
-    # batch 8 - marketing spam
-    "c.hellofresh.com",
-    "email.ticketmaster.com",
-    "roktpowered.com",
-    "101domain.com",
-    "simonsfoundation.org",
-    "slack.zendesk.com",
-    "contact.exploratorium.edu",
-    # batch 9 - political
-    "yimbyaction.org",
-    "e.giffords.org",
-    "e.votevets.org",
-    "e.elissaslotkin.org",
-    "e.chrispappas.org",
-    "foe.org",
-    # batch 10 - more newsletters/marketing
-    "mail.hallow.com",
-    "e.roadtrippers.com",
-    "e.starbucks.com",
-    "newsletter.trip.com",
-    "23andme.com",
-    "bookcrossing.com",
-    "peakdesign.com",
-    "bark.co",
-    "emails.wyndhamhotels.com",
-    "fluent.pet",
-    "mailout.plex.tv",
-    "ctoconnection.com",
-    "chewy.com",
-    "e.vacasa.com",
-    "join.netflix.com",
-    "e.worldnomads.com",
-    "tonal.com",
-    "mschf.com",
-    "announcements.soundcloud.com",
-    "updates.miro.com",
-    "info.haymarketmedicalnetwork.com",
-    # batch 11 - more marketing/notifications
-    "baukunst.co",
-    "latecheckout.studio",
-    "notifications.ro.co",
-    "thelostchurch.org",
-    "nanit.com",
-    "namecheap.com",
-    "autodeskcommunications.com",
-    "sensibo.com",
-    "e.electjon.com",
-    "techcrunch.com",
-    "audible.com",
-    "vcita.com",
-    "email.1password.com",
-    "mail.coinbase.com",
-    "twitch.tv",
-    # batch 12 - more marketing
-    "slack.com",
-    "mail.airtable.com",
-    "mn.co",
-    "thekla.com",
-    "messaging.squareup.com",
-    "butterand.com",
-    "androidjones.com",
-    "babalou.com",
-    "craigslist.org",
-    "reply.craigslist.org",
-    "gregangelo.com",
-    "texasexesemail.com",
-    "proofre.com",
-    "qrzcq.com",
-    "barszranch.com",
-    "e.smartnews.com",
-    "theclymb.com",
-    "is.email.nextdoor.com",
-    "reply.chargepoint.com",
-    "team.twilio.com",
-    "e.debhaaland.com",
-    "rackwarehouse.com",
-    "paws.petmeds.com",
-    "kochdavisjobs.com",
-    "fightforthefuture.org",
-    "youtube.com",
-    "outreach.assembly.ca.gov",
-    # batch 13 - more marketing/notifications
-    "catmachin.com",
-    "info.blueshieldca.com",
-    "mailgun.gingrapp.com",
-    "connect.othership.us",
-    "polytrope.com",
-    "greathighwaypark.com",
-    "linkedin.com",
-    "redheron.com",
-    "labcorpmessage.com",
-    "email.modernanimal.com",
-    "e.healio.com",
-    "email.classmates.com",
-    "false-profit.com",
-    "heathceramics.com",
-    "vowel.com",
-    "email.venmo.com",
-    "wakethetalkup.com",
-    "engineeredartworks.com",
-    "duolingo.com",
-    "em.shutterfly.com",
-    "vagaro.com",
-    "retainhr.com",
-    # batch 14 - more marketing/notifications
-    "marketing.coveredca.com",
-    "e.simonmed.com",
-    "g.hellofresh.com",
-    "visaprepaidprocessing.com",
-    "service.alibaba.com",
-    "engage.microsoft.com",
-    "notices.rei.com",
-    "godaddy.com",
-    "frankenforiowa.org",
-    "flocksafety.com",
-    "unity3d.com",
-    "dnuke.com",
-    "avimark1.com",
-    "sagebionetworks.org",
-    "spaero.bio",
-    # batch 15 - more marketing/newsletters
-    "mealtrain.com",
-    "campaign.eventbrite.com",
-    "g.kajabimail.net",
-    "c.kajabimail.net",
-    "mrktgllry.com",
-    "globaldatamarketplace.com",
-    "me.kickstarter.com",
-    "joshshapiro.org",
-    "mail.keeps.com",
-    "mail.lakeshorelearning.com",
-    "fogcitydogs.com",
-    "e.fastcompany.com",
-    "onemedical.com",
-    "honeyhomes.com",
-    # batch 16 - more marketing/newsletters
-    "lookingup.art",
-    "climatetechaction.network",
-    "crunchlabs.com",
-    "producthunt.com",
-    "mail.adobe.com",
-    "173366937.mailchimpapp.com",
-    "kimblegroup.com",
-    # batch 17 - community/retail
-    "hazardfactory.org",
-    "ss.email.nextdoor.com",
-    "sportsbasement.com",
-    "onlinebookclub.org",
-    "manifold.markets",
-}
+def _load_patterns(path):
+    """Return the set of patterns in path, one per line, skipping # comments"""
+    with open(path) as f:
+        return {line for line in map(str.strip, f) if line and not line.startswith("#")}
+
+# Senders to always archive - add domains to archive_senders.txt as we
+# confirm they're noise
+ARCHIVE_SENDERS = _load_patterns(Path(__file__).with_name("archive_senders.txt"))
 
 # Senders that should go to review (potentially actionable)
 REVIEW_SENDERS = {
     # Add senders that need human attention here
 }
 
-def should_archive(email):
-    """Return True if email should be auto-archived"""
-    from_addr = email.get("from", "").lower()
-    for pattern in ARCHIVE_SENDERS:
-        if pattern in from_addr:
+def _trie_source(trie):
+    # A word ending here already matches; longer ones sharing it don't matter
+    if "" in trie:
+        return ""
+    branches = [re.escape(ch) + _trie_source(child) for ch, child in sorted(trie.items())]
+    if len(branches) == 1:
+        return branches[0]
+    return "(?:" + "|".join(branches) + ")"
+
+def _compile_patterns(patterns):
+    """Compile substring patterns into one regex for lowercased addresses
+
+    Shared prefixes are factored out into a trie, so at each position re
+    follows the branch for the next character instead of retrying every
+    pattern in turn
+    """
+    trie = {}
+    for pattern in patterns:
+        node = trie
+        for ch in pattern.lower():
+            node = node.setdefault(ch, {})
+        node[""] = {}
+    # An empty alternation would match everything
+    return re.compile(_trie_source(trie) if trie else "(?!)")
+
+# Bare domains match the domain of any address in the from header, or any
+# subdomain of it; full addresses are still matched as substrings
+_ARCHIVE_DOMAINS = frozenset(p.lower() for p in ARCHIVE_SENDERS if "@" not in p)
+_ARCHIVE_DOMAIN_RE = _compile_patterns(_ARCHIVE_DOMAINS)
+_ARCHIVE_RE = _compile_patterns(p for p in ARCHIVE_SENDERS if "@" in p)
+
+# The hostname after each @, wherever it sits: "a@x.com (X)", "X < a@x.com >"
+# and "Y <b@y.com>, X <a@x.com>" all yield x.com
+_HOST_RE = re.compile(r"@([a-z0-9_-]+(?:\.[a-z0-9_-]+)+)")
+
+def _domain_listed(domain, domains):
+    """Return True if domain or one of its parent domains is in domains"""
+    while domain:
+        if domain in domains:
             return True
+        domain = domain.partition(".")[2]
     return False
 
+_REVIEW_RE = _compile_patterns(REVIEW_SENDERS)
+
+def _is_archive_sender(from_addr):
+    hosts = _HOST_RE.findall(from_addr)
+    if hosts:
+        if any(_domain_listed(host, _ARCHIVE_DOMAINS) for host in hosts):
+            return True
+    elif _ARCHIVE_DOMAIN_RE.search(from_addr):
+        # No clean hostname to look up, so match the domains as substrings
+        return True
+    return _ARCHIVE_RE.search(from_addr) is not None
+
+def _is_review_sender(from_addr):
+    return _REVIEW_RE.search(from_addr) is not None
+
+def should_archive(email):
+    """Return True if email should be auto-archived"""
+    return _is_archive_sender(email.get("from", "").lower())
+
 def needs_review(email):
     """Return True if email might need attention"""
-    from_addr = email.get("from", "").lower()
-    for pattern in REVIEW_SENDERS:
-        if pattern in from_addr:
-            return True
-    return False
+    return _is_review_sender(email.get("from", "").lower())
+
+@functools.lru_cache(maxsize=4096)
+def _classify(from_addr):
+    """Return "review", "archive" or None for a from header
+
+    Cached because most of an inbox comes from a small set of senders
+    """
+    from_addr = from_addr.lower()
+    if _is_review_sender(from_addr):
+        return "review"
+    if _is_archive_sender(from_addr):
+        return "archive"
+    return None
 
+@functools.lru_cache(maxsize=8192)
 def get_domain(from_addr):
     """Extract domain from email address"""
     if "<" in from_addr:
@@ -258,38 +126,95 @@ def get_domain(from_addr):
         return from_addr.split("@")[1].lower()
     return from_addr.lower()[:50]
 
+def _triage_one(filepath, cached):
+    """Read, classify and move one inbox file
+
+    cached is the file's cache entry, if any. Returns (decision, name,
+    (ino, mtime_ns), sender), or None if the file couldn't be read
+    """
+    name = os.path.basename(filepath)
+    try:
+        st = os.stat(filepath)
+        key = (st.st_ino, st.st_mtime_ns)
+        if cached is not None and cached[0] == key:
+            sender = cached[1]
+        else:
+            sender = read_fields(filepath, ("from",)).get("from")
+    except:
+        return None
+
+    decision = _classify(sender or "")
+    if decision == "review":
+        os.replace(filepath, NEEDS_REVIEW / name)
+    elif decision == "archive":
+        os.replace(filepath, TO_ARCHIVE / name)
+    return decision, name, key, sender
+
+def _open_cache():
+    conn = sqlite3.connect(CACHE_DB)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    if conn.execute("PRAGMA user_version").fetchone()[0] != CACHE_VERSION:
+        # Written by an older sender extractor; its rows can't be trusted
+        with conn:
+            conn.execute("DROP TABLE IF EXISTS senders")
+            conn.execute(f"PRAGMA user_version = {CACHE_VERSION}")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS senders "
+        "(name TEXT PRIMARY KEY, ino INTEGER, mtime_ns INTEGER, sender TEXT)"
+    )
+    return conn
+
+def _load_cache(conn):
+    """Return {name: ((ino, mtime_ns), sender)} from the cache"""
+    rows = conn.execute("SELECT name, ino, mtime_ns, sender FROM senders")
+    return {name: ((ino, mtime_ns), sender) for name, ino, mtime_ns, sender in rows}
+
+def _save_cache(conn, rows):
+    """Replace the cache with rows of (name, ino, mtime_ns, sender)"""
+    with conn:
+        conn.execute("DELETE FROM senders")
+        conn.executemany("INSERT INTO senders VALUES (?, ?, ?, ?)", rows)
+
 def main():
     TO_ARCHIVE.mkdir(exist_ok=True)
     NEEDS_REVIEW.mkdir(exist_ok=True)
 
     stats = {"archive": 0, "review": 0, "unknown": 0}
-    sender_counts = defaultdict(int)
-
-    for filepath in sorted(INBOX.glob("*.json")):
-        try:
-            with open(filepath) as f:
-                email = json.load(f)
-        except:
-            continue
-
-        if needs_review(email):
-            shutil.move(str(filepath), str(NEEDS_REVIEW / filepath.name))
-            stats["review"] += 1
-        elif should_archive(email):
-            shutil.move(str(filepath), str(TO_ARCHIVE / filepath.name))
-            stats["archive"] += 1
-        else:
-            stats["unknown"] += 1
-            domain = get_domain(email.get("from", "unknown"))
-            sender_counts[domain] += 1
+    sender_counts = Counter()
+
+    conn = _open_cache()
+    cache = _load_cache(conn)
+    # Cache rows for the files still in the inbox after this run
+    remaining = []
+
+    files = json_files(INBOX)
+    cached = [cache.get(os.path.basename(f)) for f in files]
+
+    with ThreadPoolExecutor(max_workers=TRIAGE_WORKERS) as ex:
+        for result in ex.map(_triage_one, files, cached):
+            if result is None:
+                continue
+            decision, name, key, sender = result
+            if decision == "review":
+                stats["review"] += 1
+            elif decision == "archive":
+                stats["archive"] += 1
+            else:
+                stats["unknown"] += 1
+                domain = get_domain("unknown" if sender is None else sender)
+                sender_counts[domain] += 1
+                remaining.append((name, *key, sender))
+
+    _save_cache(conn, remaining)
+    conn.close()
 
     print(f"Archived:     {stats['archive']}")
     print(f"To Review:    {stats['review']}")
     print(f"Unprocessed:  {stats['unknown']}")
 
-    print("\n=== SENDER DOMAINS BY COUNT (add to ARCHIVE_SENDERS to archive) ===")
-    sorted_senders = sorted(sender_counts.items(), key=lambda x: -x[1])
-    for domain, count in sorted_senders[:60]:
+    print("\n=== SENDER DOMAINS BY COUNT (add to archive_senders.txt to archive) ===")
+    for domain, count in sender_counts.most_common(60):
         print(f"  {count:4d}  {domain}")
 
 if __name__ == "__main__":